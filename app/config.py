@@ -1,5 +1,6 @@
 import os
 from dataclasses import dataclass
+from functools import lru_cache
 
 
 @dataclass(frozen=True)
@@ -7,17 +8,25 @@ class Settings:
     database_url: str
     webhook_secret: str | None
     log_level: str
+    profiling: bool = False
 
 
+@lru_cache(maxsize=1)
 def load_settings() -> Settings:
     database_url = os.environ.get("DATABASE_URL", "").strip()
     webhook_secret = os.environ.get("WEBHOOK_SECRET", "").strip() or None
     log_level = os.environ.get("LOG_LEVEL", "INFO").strip().upper() or "INFO"
+    profiling = os.environ.get("PROFILING", "").strip().lower() in ("1", "true", "yes")
 
     if not database_url:
         raise RuntimeError("DATABASE_URL is required")
 
-    return Settings(database_url=database_url, webhook_secret=webhook_secret, log_level=log_level)
+    return Settings(
+        database_url=database_url,
+        webhook_secret=webhook_secret,
+        log_level=log_level,
+        profiling=profiling,
+    )
 
 
 def sqlite_path_from_url(database_url: str) -> str:
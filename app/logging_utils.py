@@ -1,6 +1,7 @@
-import json
 import logging
-from datetime import datetime, timezone
+import time
+
+from app.json_utils import dumps
 
 
 def configure_logging(level: str) -> logging.Logger:
@@ -8,12 +9,22 @@ def configure_logging(level: str) -> logging.Logger:
     return logging.getLogger("app")
 
 
+_now_iso_cache: tuple[int, str] = (0, "")
+
+
 def now_iso() -> str:
-    return datetime.now(timezone.utc).replace(microsecond=0).isoformat().replace("+00:00", "Z")
+    # The string only changes once per second; a single tuple keeps (second, string) consistent across threads.
+    global _now_iso_cache
+    t = int(time.time())
+    cached_t, cached = _now_iso_cache
+    if t != cached_t:
+        cached = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(t))
+        _now_iso_cache = (t, cached)
+    return cached
 
 
 def log_json(logger: logging.Logger, level: int, payload: dict) -> None:
     if "ts" not in payload:
         payload = {"ts": now_iso(), **payload}
     payload = {**payload, "level": logging.getLevelName(level)}
-    logger.log(level, json.dumps(payload, separators=(",", ":"), ensure_ascii=False))
+    logger.log(level, dumps(payload).decode("utf-8"))
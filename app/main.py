@@ -1,25 +1,152 @@
+import asyncio
+import base64
 import hashlib
 import hmac
-import json
 import logging
+import os
+import ssl
 import time
-import uuid
+from typing import Any
 
+import msgspec
 from fastapi import FastAPI, Header, HTTPException, Query, Request
-from fastapi.encoders import jsonable_encoder
-from fastapi.responses import JSONResponse, PlainTextResponse
-from pydantic import ValidationError
+from fastapi.responses import PlainTextResponse, Response
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
 
 from app.config import load_settings, sqlite_path_from_url
+from app.json_utils import ORJSONResponse, dumps, loads
 from app.logging_utils import configure_logging, log_json, now_iso
 from app.metrics import Metrics
-from app.models import MessagesResponse, MessageIn, StatsResponse, WebhookOk
+from app.models import (
+    MessagesResponse,
+    StatsResponse,
+    WebhookOk,
+    message_field_errors,
+    message_in_decoder,
+    validation_error_detail,
+)
 from app.models import _validate_utc_z
-from app.storage import check_db, compute_stats, ensure_schema, insert_message, list_messages
+from app.profiling import install_profiling
+from app.storage import (
+    MessageWriter,
+    check_db,
+    compute_stats,
+    ensure_schema,
+    list_messages,
+    open_db,
+    open_read_pool,
+)
+
+
+_STATS_CACHE_TTL_S = 1.0
+_METRICS_REFRESH_S = 0.5
+_WEBHOOK_OK_BODY = dumps({"status": "ok"})
+
+
+_HMAC_IPAD = bytes(x ^ 0x36 for x in range(256))
+_HMAC_OPAD = bytes(x ^ 0x5C for x in range(256))
+
+
+def _sig_contexts(secret_bytes: bytes) -> tuple[Any, Any]:
+    # HMAC-SHA256 with the key-dependent first block of the inner and outer hashes
+    # absorbed once; per request only copies of these two states are needed.
+    block_size = hashlib.sha256().block_size
+    key = hashlib.sha256(secret_bytes).digest() if len(secret_bytes) > block_size else secret_bytes
+    key = key.ljust(block_size, b"\0")
+    return hashlib.sha256(key.translate(_HMAC_IPAD)), hashlib.sha256(key.translate(_HMAC_OPAD))
+
+
+def _compute_sig(sig_contexts: tuple[Any, Any], raw_body: bytes) -> bytes:
+    inner = sig_contexts[0].copy()
+    inner.update(raw_body)
+    outer = sig_contexts[1].copy()
+    outer.update(inner.digest())
+    return outer.digest()
+
+
+def _decode_sig(x_signature: str | None) -> bytes:
+    if not x_signature or len(x_signature) != 64:
+        return b""
+    try:
+        return bytes.fromhex(x_signature)
+    except ValueError:
+        return b""
+
+
+class RequestLogMetricsMiddleware:
+    def __init__(self, app: ASGIApp, logger: logging.Logger, metrics: Metrics) -> None:
+        self.app = app
+        self.logger = logger
+        self.metrics = metrics
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        request_id = os.urandom(16).hex()
+        start_ns = time.perf_counter_ns()
+        state = scope.setdefault("state", {})
+        status = 500
+        response_started = False
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal status, response_started
+            if message["type"] == "http.response.start":
+                response_started = True
+                status = message["status"]
+                MutableHeaders(scope=message).append("X-Request-Id", request_id)
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        except Exception as exc:
+            status = 500
+            state["log_level"] = logging.ERROR
+            state["log_extra"] = {
+                "result": "internal_error",
+                "error": exc.__class__.__name__,
+            }
+            if response_started:
+                raise
+            response = ORJSONResponse(status_code=500, content={"detail": "internal server error"})
+            await response(scope, receive, send_wrapper)
+        finally:
+            latency_ns = time.perf_counter_ns() - start_ns
+
+            level = state.get("log_level", logging.INFO)
+            if self.logger.isEnabledFor(level):
+                payload = {
+                    "ts": now_iso(),
+                    "request_id": request_id,
+                    "method": scope["method"],
+                    "path": scope["path"],
+                    "status": status,
+                    "latency_ms": round(latency_ns / 1_000_000, 2),
+                }
 
+                extra = state.get("log_extra")
+                if isinstance(extra, dict):
+                    payload.update(extra)
 
-def _compute_sig(secret: str, raw_body: bytes) -> str:
-    return hmac.new(secret.encode("utf-8"), raw_body, hashlib.sha256).hexdigest()
+                log_json(self.logger, level, payload)
+
+            self.metrics.observe_http(scope["path"], status, latency_ns)
+
+
+def _encode_cursor(key: tuple[str, str]) -> str:
+    return base64.urlsafe_b64encode(dumps(list(key))).decode("ascii").rstrip("=")
+
+
+def _decode_cursor(cursor: str) -> tuple[str, str]:
+    value = loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+    if not isinstance(value, list) or len(value) != 2:
+        raise ValueError("invalid cursor")
+    ts, message_id = value
+    if not isinstance(ts, str) or not isinstance(message_id, str):
+        raise ValueError("invalid cursor")
+    return ts, message_id
 
 
 def create_app() -> FastAPI:
@@ -27,62 +154,82 @@ def create_app() -> FastAPI:
     logger = configure_logging(settings.log_level)
     metrics = Metrics()
 
-    app = FastAPI()
+    app = FastAPI(default_response_class=ORJSONResponse)
     app.state.settings = settings
     app.state.logger = logger
     app.state.metrics = metrics
     app.state.db_path = sqlite_path_from_url(settings.database_url)
     app.state.schema_ok = False
+    app.state.db = None
+    app.state.read_pool = None
+    app.state.writer = None
+    app.state.metrics_cached = metrics.render_prometheus().encode("utf-8")
+    app.state.metrics_rendered_at = time.monotonic()
+    app.state.metrics_task = None
+    app.state.stats_generation = 0
+    app.state.stats_cache = {"at": 0.0, "generation": 0, "body": None}
+    app.state.sig_contexts = (
+        _sig_contexts(settings.webhook_secret.encode("utf-8")) if settings.webhook_secret else None
+    )
+
+    def _render_metrics() -> None:
+        app.state.metrics_cached = app.state.metrics.render_prometheus().encode("utf-8")
+        app.state.metrics_rendered_at = time.monotonic()
+
+    async def _refresh_metrics() -> None:
+        while True:
+            try:
+                _render_metrics()
+            except Exception as exc:
+                log_json(
+                    logger,
+                    logging.ERROR,
+                    {"event": "metrics_refresh_failed", "error": exc.__class__.__name__},
+                )
+            await asyncio.sleep(_METRICS_REFRESH_S)
 
     @app.on_event("startup")
     async def _startup() -> None:
+        app.state.metrics_task = asyncio.create_task(_refresh_metrics())
+        log_json(
+            logger,
+            logging.INFO,
+            {
+                "event": "hash_backend",
+                "openssl_version": ssl.OPENSSL_VERSION,
+                "sha256_impl": hashlib.sha256.__module__,
+                "algorithms_available": sorted(hashlib.algorithms_available),
+            },
+        )
         try:
-            await ensure_schema(app.state.db_path)
+            app.state.db = await open_db(app.state.db_path)
+            await ensure_schema(app.state.db)
+            app.state.read_pool = await open_read_pool(app.state.db_path, app.state.db)
+            app.state.writer = MessageWriter(app.state.db)
+            app.state.writer.start()
             app.state.schema_ok = True
         except Exception:
             app.state.schema_ok = False
 
-    @app.middleware("http")
-    async def _request_middleware(request: Request, call_next):
-        request_id = uuid.uuid4().hex
-        request.state.request_id = request_id
-        start = time.perf_counter()
-        status = 500
-        response = None
-
-        try:
-            response = await call_next(request)
-            status = response.status_code
-        except Exception as exc:
-            status = 500
-            request.state.log_level = logging.ERROR
-            request.state.log_extra = {
-                "result": "internal_error",
-                "error": exc.__class__.__name__,
-            }
-            response = JSONResponse(status_code=500, content={"detail": "internal server error"})
-
-        latency_ms = (time.perf_counter() - start) * 1000.0
-        response.headers["X-Request-Id"] = request_id
-
-        payload = {
-            "ts": now_iso(),
-            "request_id": request_id,
-            "method": request.method,
-            "path": request.url.path,
-            "status": status,
-            "latency_ms": round(latency_ms, 2),
-        }
-
-        extra = getattr(request.state, "log_extra", None)
-        if isinstance(extra, dict):
-            payload.update(extra)
-
-        level = getattr(request.state, "log_level", logging.INFO)
-        log_json(app.state.logger, level, payload)
-
-        app.state.metrics.observe_http(request.url.path, status, latency_ms)
-        return response
+    @app.on_event("shutdown")
+    async def _shutdown() -> None:
+        if app.state.metrics_task is not None:
+            app.state.metrics_task.cancel()
+            try:
+                await app.state.metrics_task
+            except asyncio.CancelledError:
+                pass
+            app.state.metrics_task = None
+        if app.state.writer is not None:
+            await app.state.writer.close()
+        if app.state.read_pool is not None:
+            await app.state.read_pool.close()
+        if app.state.db is not None:
+            await app.state.db.close()
+
+    app.add_middleware(RequestLogMetricsMiddleware, logger=logger, metrics=metrics)
+    if settings.profiling:
+        install_profiling(app)
 
     @app.get("/health/live")
     async def health_live():
@@ -91,10 +238,10 @@ def create_app() -> FastAPI:
     @app.get("/health/ready")
     async def health_ready():
         secret_ok = app.state.settings.webhook_secret is not None
-        db_ok = app.state.schema_ok and await check_db(app.state.db_path)
+        db_ok = app.state.schema_ok and await check_db(app.state.db)
         if secret_ok and db_ok:
             return {"status": "ready"}
-        return JSONResponse(status_code=503, content={"status": "not_ready"})
+        return ORJSONResponse(status_code=503, content={"status": "not_ready"})
 
     @app.post("/webhook", response_model=WebhookOk)
     async def webhook(request: Request, x_signature: str | None = Header(default=None, alias="X-Signature")):
@@ -103,15 +250,23 @@ def create_app() -> FastAPI:
 
         raw_for_json = raw[3:] if raw.startswith(b"\xef\xbb\xbf") else raw
 
+        msg = None
+        validation_errors: list[dict] = []
         message_id_for_log = None
         try:
-            parsed = json.loads(raw_for_json.decode("utf-8"))
-            if isinstance(parsed, dict):
-                mid = parsed.get("message_id")
-                if isinstance(mid, str):
-                    message_id_for_log = mid
-        except Exception:
-            pass
+            msg = message_in_decoder.decode(raw_for_json)
+            message_id_for_log = msg.message_id
+            validation_errors = message_field_errors(msg)
+        except msgspec.MsgspecError as e:
+            validation_errors = validation_error_detail(e)
+            try:
+                parsed = loads(raw_for_json)
+                if isinstance(parsed, dict):
+                    mid = parsed.get("message_id")
+                    if isinstance(mid, str):
+                        message_id_for_log = mid
+            except Exception:
+                pass
 
         if not secret:
             request.state.log_level = logging.ERROR
@@ -122,8 +277,8 @@ def create_app() -> FastAPI:
             }
             raise HTTPException(status_code=503, detail="webhook secret not configured")
 
-        expected = _compute_sig(secret, raw)
-        if not x_signature or not hmac.compare_digest(expected, x_signature):
+        expected = _compute_sig(app.state.sig_contexts, raw)
+        if not hmac.compare_digest(expected, _decode_sig(x_signature)):
             app.state.metrics.inc_webhook("invalid_signature")
             request.state.log_level = logging.ERROR
             request.state.log_extra = {
@@ -131,11 +286,9 @@ def create_app() -> FastAPI:
                 "dup": False,
                 "result": "invalid_signature",
             }
-            return JSONResponse(status_code=401, content={"detail": "invalid signature"})
+            return ORJSONResponse(status_code=401, content={"detail": "invalid signature"})
 
-        try:
-            msg = MessageIn.model_validate_json(raw_for_json)
-        except ValidationError as e:
+        if validation_errors:
             app.state.metrics.inc_webhook("validation_error")
             request.state.log_level = logging.ERROR
             request.state.log_extra = {
@@ -143,9 +296,14 @@ def create_app() -> FastAPI:
                 "dup": False,
                 "result": "validation_error",
             }
-            return JSONResponse(status_code=422, content=jsonable_encoder({"detail": e.errors()}))
-
-        created = await insert_message(app.state.db_path, msg)
+            return ORJSONResponse(
+                status_code=422,
+                content={"detail": validation_errors},
+            )
+
+        created = await app.state.writer.insert(msg)
+        if created:
+            app.state.stats_generation += 1
         result = "created" if created else "duplicate"
         app.state.metrics.inc_webhook(result)
 
@@ -154,7 +312,7 @@ def create_app() -> FastAPI:
             "dup": not created,
             "result": result,
         }
-        return {"status": "ok"}
+        return Response(content=_WEBHOOK_OK_BODY, media_type="application/json")
 
     @app.get("/messages", response_model=MessagesResponse)
     async def get_messages(
@@ -163,6 +321,7 @@ def create_app() -> FastAPI:
         from_msisdn: str | None = Query(default=None, alias="from"),
         since: str | None = Query(default=None),
         q: str | None = Query(default=None),
+        cursor: str | None = Query(default=None),
     ):
         if since is not None:
             try:
@@ -170,23 +329,53 @@ def create_app() -> FastAPI:
             except Exception:
                 raise HTTPException(status_code=422, detail=[{"loc": ["query", "since"], "msg": "invalid since", "type": "value_error"}])
 
-        data, total = await list_messages(
-            app.state.db_path,
-            limit=limit,
-            offset=offset,
-            from_msisdn=from_msisdn,
-            since=since,
-            q=q,
-        )
-        return {"data": data, "total": total, "limit": limit, "offset": offset}
+        after = None
+        if cursor is not None:
+            # Keyset pages start right after the cursor, so any offset is ignored (and echoed as 0).
+            offset = 0
+            try:
+                after = _decode_cursor(cursor)
+            except Exception:
+                raise HTTPException(status_code=422, detail=[{"loc": ["query", "cursor"], "msg": "invalid cursor", "type": "value_error"}])
+
+        async with app.state.read_pool.acquire() as db:
+            data, total, next_key = await list_messages(
+                db,
+                limit=limit,
+                offset=offset,
+                from_msisdn=from_msisdn,
+                since=since,
+                q=q,
+                after=after,
+            )
+        next_cursor = _encode_cursor(next_key) if next_key is not None else None
+        # Already plain JSON types: skip FastAPI's jsonable_encoder/response_model pass
+        # (response_model is kept for the OpenAPI schema only).
+        body = dumps({"data": data, "total": total, "limit": limit, "offset": offset, "next_cursor": next_cursor})
+        return Response(content=body, media_type="application/json")
 
     @app.get("/stats", response_model=StatsResponse)
     async def stats():
-        return await compute_stats(app.state.db_path)
+        cache = app.state.stats_cache
+        generation = app.state.stats_generation
+        if (
+            cache["body"] is not None
+            and cache["generation"] == generation
+            and time.monotonic() - cache["at"] < _STATS_CACHE_TTL_S
+        ):
+            return Response(content=cache["body"], media_type="application/json")
+
+        async with app.state.read_pool.acquire() as db:
+            body = dumps(await compute_stats(db))
+        app.state.stats_cache = {"at": time.monotonic(), "generation": generation, "body": body}
+        return Response(content=body, media_type="application/json")
 
     @app.get("/metrics")
     async def metrics_endpoint():
-        return PlainTextResponse(content=app.state.metrics.render_prometheus(), media_type="text/plain")
+        # Normally a no-op; covers a refresher that is late or has not run since startup.
+        if time.monotonic() - app.state.metrics_rendered_at >= _METRICS_REFRESH_S:
+            _render_metrics()
+        return PlainTextResponse(content=app.state.metrics_cached, media_type="text/plain")
 
     return app
 
@@ -1,43 +1,103 @@
 import threading
+from bisect import bisect_left
 from collections import defaultdict
 
 
+class _Shard:
+    __slots__ = (
+        "http_requests_total",
+        "webhook_requests_total",
+        "latency_bucket_hits",
+        "latency_count",
+        "latency_sum_ns",
+    )
+
+    def __init__(self, bucket_count: int) -> None:
+        self.http_requests_total: dict[tuple[str, int], int] = defaultdict(int)
+        self.webhook_requests_total: dict[str, int] = defaultdict(int)
+        # Per-bucket (non-cumulative) hits; render_prometheus accumulates them.
+        self.latency_bucket_hits = [0] * bucket_count
+        self.latency_count = 0
+        self.latency_sum_ns = 0
+
+
 class Metrics:
     def __init__(self) -> None:
-        self._lock = threading.Lock()
-        self._http_requests_total: dict[tuple[str, str], int] = defaultdict(int)
-        self._webhook_requests_total: dict[str, int] = defaultdict(int)
-        self._latency_buckets_ms = [100.0, 500.0, float("inf")]
-        self._latency_bucket_counts = [0, 0, 0]
-        self._latency_count = 0
-        self._latency_sum = 0.0
-
-    def observe_http(self, path: str, status: int, latency_ms: float) -> None:
-        with self._lock:
-            self._http_requests_total[(path, str(status))] += 1
-            self._latency_count += 1
-            self._latency_sum += float(latency_ms)
-            for i, le in enumerate(self._latency_buckets_ms):
-                if latency_ms <= le:
-                    self._latency_bucket_counts[i] += 1
+        # Each thread only writes its own shard, so the hot path takes no lock and
+        # render_prometheus sums the shards. Shards are kept after their thread exits
+        # so the exported counters never go backwards.
+        self._local = threading.local()
+        self._shards: list[_Shard] = []
+        self._shards_lock = threading.Lock()
+        # Finite upper bounds; the implicit last bucket is +Inf. Observations arrive in
+        # integer nanoseconds so bucketing is a pure int comparison.
+        self._latency_buckets_ms = (100, 500)
+        self._latency_buckets_ns = tuple(le * 1_000_000 for le in self._latency_buckets_ms)
+        self._http_labels: dict[tuple[str, int], str] = {}
+        self._webhook_labels: dict[str, str] = {}
+        self._bucket_labels = tuple(
+            f'request_latency_ms_bucket{{le="{le}"}} ' for le in (*self._latency_buckets_ms, "+Inf")
+        )
+
+    def _shard(self) -> _Shard:
+        try:
+            return self._local.shard
+        except AttributeError:
+            shard = _Shard(len(self._bucket_labels))
+            with self._shards_lock:
+                self._shards.append(shard)
+            self._local.shard = shard
+            return shard
+
+    def observe_http(self, path: str, status: int, latency_ns: int) -> None:
+        shard = self._shard()
+        shard.http_requests_total[(path, status)] += 1
+        shard.latency_count += 1
+        shard.latency_sum_ns += latency_ns
+        shard.latency_bucket_hits[bisect_left(self._latency_buckets_ns, latency_ns)] += 1
 
     def inc_webhook(self, result: str) -> None:
-        with self._lock:
-            self._webhook_requests_total[result] += 1
+        self._shard().webhook_requests_total[result] += 1
 
     def render_prometheus(self) -> str:
+        with self._shards_lock:
+            shards = list(self._shards)
+
+        http_requests_total: dict[tuple[str, int], int] = defaultdict(int)
+        webhook_requests_total: dict[str, int] = defaultdict(int)
+        bucket_hits = [0] * len(self._bucket_labels)
+        latency_count = 0
+        latency_sum_ns = 0
+        for shard in shards:
+            for key, value in dict(shard.http_requests_total).items():
+                http_requests_total[key] += value
+            for result, value in dict(shard.webhook_requests_total).items():
+                webhook_requests_total[result] += value
+            for i, hits in enumerate(list(shard.latency_bucket_hits)):
+                bucket_hits[i] += hits
+            latency_count += shard.latency_count
+            latency_sum_ns += shard.latency_sum_ns
+
         lines: list[str] = []
-        with self._lock:
-            for (path, status), value in sorted(self._http_requests_total.items()):
-                lines.append(f'http_requests_total{{path="{path}",status="{status}"}} {value}')
-            for result, value in sorted(self._webhook_requests_total.items()):
-                lines.append(f'webhook_requests_total{{result="{result}"}} {value}')
-
-            for le, count in zip(self._latency_buckets_ms, self._latency_bucket_counts):
-                le_label = "+Inf" if le == float("inf") else str(int(le))
-                lines.append(f'request_latency_ms_bucket{{le="{le_label}"}} {count}')
-
-            lines.append(f"request_latency_ms_count {self._latency_count}")
-            lines.append(f"request_latency_ms_sum {self._latency_sum}")
+        for (path, status), value in sorted(http_requests_total.items()):
+            label = self._http_labels.get((path, status))
+            if label is None:
+                label = f'http_requests_total{{path="{path}",status="{status}"}} '
+                self._http_labels[(path, status)] = label
+            lines.append(label + str(value))
+        for result, value in sorted(webhook_requests_total.items()):
+            label = self._webhook_labels.get(result)
+            if label is None:
+                label = f'webhook_requests_total{{result="{result}"}} '
+                self._webhook_labels[result] = label
+            lines.append(label + str(value))
+
+        cumulative = 0
+        for label, hits in zip(self._bucket_labels, bucket_hits):
+            cumulative += hits
+            lines.append(label + str(cumulative))
+
+        lines.append(f"request_latency_ms_count {latency_count}")
+        lines.append(f"request_latency_ms_sum {latency_sum_ns / 1_000_000}")
 
         return "\n".join(lines) + "\n"
@@ -1,48 +1,56 @@
-import re
 from datetime import datetime
+from typing import Annotated
 
-from pydantic import BaseModel, Field, field_validator
+import msgspec
+from pydantic import BaseModel, Field
 
 
-_E164_RE = re.compile(r"^\+[0-9]+$")
+def _is_e164(v: str) -> bool:
+    digits = v[1:]
+    return v.startswith("+") and digits.isdigit() and digits.isascii()
 
 
 def _validate_utc_z(v: str) -> str:
     if not isinstance(v, str) or not v.endswith("Z"):
         raise ValueError("ts must be an ISO-8601 UTC timestamp with Z suffix")
+    if len(v) == 20 and v[4] == v[7] == "-" and v[10] == "T" and v[13] == v[16] == ":":
+        # Plain YYYY-MM-DDTHH:MM:SSZ: the Z already pins UTC, only the fields need checking.
+        datetime.fromisoformat(v[:19])
+        return v
     dt = datetime.fromisoformat(v.replace("Z", "+00:00"))
     if dt.utcoffset() is None or dt.utcoffset().total_seconds() != 0:
         raise ValueError("ts must be UTC")
     return v
 
 
-class MessageIn(BaseModel):
-    message_id: str = Field(min_length=1)
-    from_msisdn: str = Field(alias="from")
-    to_msisdn: str = Field(alias="to")
+class MessageIn(msgspec.Struct, rename={"from_msisdn": "from", "to_msisdn": "to"}):
+    message_id: Annotated[str, msgspec.Meta(min_length=1)]
+    from_msisdn: str
+    to_msisdn: str
     ts: str
-    text: str | None = Field(default=None, max_length=4096)
+    text: Annotated[str, msgspec.Meta(max_length=4096)] | None = None
 
-    model_config = {"populate_by_name": True}
 
-    @field_validator("from_msisdn")
-    @classmethod
-    def validate_from(cls, v: str) -> str:
-        if not isinstance(v, str) or not _E164_RE.match(v):
-            raise ValueError("from must be in E.164-like format")
-        return v
+def message_field_errors(msg: MessageIn) -> list[dict]:
+    errors: list[dict] = []
+    if not _is_e164(msg.from_msisdn):
+        errors.append({"loc": ["body", "from"], "msg": "from must be in E.164-like format", "type": "value_error"})
+    if not _is_e164(msg.to_msisdn):
+        errors.append({"loc": ["body", "to"], "msg": "to must be in E.164-like format", "type": "value_error"})
+    try:
+        _validate_utc_z(msg.ts)
+    except ValueError as e:
+        errors.append({"loc": ["body", "ts"], "msg": str(e), "type": "value_error"})
+    return errors
+
+
+def validation_error_detail(exc: msgspec.MsgspecError) -> list[dict]:
+    if isinstance(exc, msgspec.ValidationError):
+        return [{"loc": ["body"], "msg": str(exc), "type": "value_error"}]
+    return [{"loc": ["body"], "msg": str(exc), "type": "json_invalid"}]
 
-    @field_validator("to_msisdn")
-    @classmethod
-    def validate_to(cls, v: str) -> str:
-        if not isinstance(v, str) or not _E164_RE.match(v):
-            raise ValueError("to must be in E.164-like format")
-        return v
 
-    @field_validator("ts")
-    @classmethod
-    def validate_ts(cls, v: str) -> str:
-        return _validate_utc_z(v)
+message_in_decoder = msgspec.json.Decoder(MessageIn)
 
 
 class MessageOut(BaseModel):
@@ -60,6 +68,7 @@ class MessagesResponse(BaseModel):
     total: int
     limit: int
     offset: int
+    next_cursor: str | None = None
 
 
 class WebhookOk(BaseModel):
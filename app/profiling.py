@@ -0,0 +1,56 @@
+import asyncio
+import cProfile
+import io
+import pstats
+
+from fastapi import FastAPI, HTTPException, Query, Request
+from fastapi.responses import HTMLResponse, PlainTextResponse
+
+
+def install_profiling(app: FastAPI) -> None:
+    try:
+        from pyinstrument import Profiler
+    except ImportError as exc:
+        raise RuntimeError("PROFILING=1 requires pyinstrument to be installed") from exc
+
+    # pyinstrument and cProfile both hook sys.setprofile, so only one profile runs at a time.
+    busy = asyncio.Lock()
+
+    @app.middleware("http")
+    async def profile_request(request: Request, call_next):
+        if request.query_params.get("profile") != "1":
+            return await call_next(request)
+        if busy.locked():
+            return PlainTextResponse("a profile is already running", status_code=409)
+
+        async with busy:
+            profiler = Profiler(interval=0.0005, async_mode="enabled")
+            profiler.start()
+            try:
+                await call_next(request)
+            finally:
+                profiler.stop()
+        return HTMLResponse(profiler.output_html())
+
+    @app.get("/debug/pprof", response_class=PlainTextResponse, include_in_schema=False)
+    async def pprof(
+        seconds: float = Query(default=5.0, gt=0, le=60),
+        sort: str = Query(default="cumulative", pattern="^(cumulative|tottime|calls)$"),
+    ):
+        # Profiles everything the event loop runs meanwhile (other requests, the batched
+        # writer, read-pool waits), not a single request. Work inside aiosqlite's
+        # connection threads is not captured.
+        if busy.locked():
+            raise HTTPException(status_code=409, detail="a profile is already running")
+
+        async with busy:
+            profiler = cProfile.Profile()
+            profiler.enable()
+            try:
+                await asyncio.sleep(seconds)
+            finally:
+                profiler.disable()
+
+        out = io.StringIO()
+        pstats.Stats(profiler, stream=out).sort_stats(sort).print_stats(50)
+        return out.getvalue()
@@ -1,74 +1,261 @@
 from __future__ import annotations
 
-from datetime import datetime, timezone
+import asyncio
+from contextlib import asynccontextmanager
+from pathlib import Path
+from typing import AsyncIterator
 
 import aiosqlite
 
+from app.logging_utils import now_iso
 from app.models import MessageIn
 
 
-def _now_iso() -> str:
-    return datetime.now(timezone.utc).replace(microsecond=0).isoformat().replace("+00:00", "Z")
+READ_POOL_SIZE = 4
+WRITE_BATCH_SIZE = 64
 
+# The writer keeps a 64 MiB page cache; each pooled reader gets 8 MiB so a worker
+# stays around 96 MiB of cache in total instead of 64 MiB per connection.
+_READ_PRAGMAS = (
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA cache_size=-8192",
+)
+_WRITE_PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA cache_size=-65536",
+)
+
+
+class ReadPool:
+    def __init__(self, conns: list[aiosqlite.Connection], owned: bool = True) -> None:
+        self._conns = conns
+        self._owned = owned
+        self._idle: asyncio.Queue[aiosqlite.Connection] = asyncio.Queue()
+        for db in conns:
+            self._idle.put_nowait(db)
+
+    @asynccontextmanager
+    async def acquire(self) -> AsyncIterator[aiosqlite.Connection]:
+        db = await self._idle.get()
+        try:
+            yield db
+        finally:
+            self._idle.put_nowait(db)
+
+    async def close(self) -> None:
+        if self._owned:
+            for db in self._conns:
+                await db.close()
+
+
+async def open_db(db_path: str) -> aiosqlite.Connection:
+    db = await aiosqlite.connect(db_path)
+    for pragma in _WRITE_PRAGMAS:
+        await db.execute(pragma)
+    return db
+
+
+async def open_read_pool(db_path: str, writer: aiosqlite.Connection, size: int = READ_POOL_SIZE) -> ReadPool:
+    if db_path == ":memory:":
+        return ReadPool([writer], owned=False)
+
+    uri = Path(db_path).resolve().as_uri() + "?mode=ro"
+    conns: list[aiosqlite.Connection] = []
+    for _ in range(size):
+        db = await aiosqlite.connect(uri, uri=True)
+        for pragma in _READ_PRAGMAS:
+            await db.execute(pragma)
+        conns.append(db)
+    return ReadPool(conns)
 
-async def ensure_schema(db_path: str) -> None:
-    async with aiosqlite.connect(db_path) as db:
-        await db.execute(
-            "CREATE TABLE IF NOT EXISTS messages ("
-            "message_id TEXT PRIMARY KEY,"
-            "from_msisdn TEXT NOT NULL,"
-            "to_msisdn TEXT NOT NULL,"
-            "ts TEXT NOT NULL,"
-            "text TEXT,"
-            "created_at TEXT NOT NULL"
-            ")"
-        )
-        await db.commit()
 
+async def ensure_schema(db: aiosqlite.Connection) -> None:
+    await db.execute(
+        "CREATE TABLE IF NOT EXISTS messages ("
+        "message_id TEXT PRIMARY KEY,"
+        "from_msisdn TEXT NOT NULL,"
+        "to_msisdn TEXT NOT NULL,"
+        "ts TEXT NOT NULL,"
+        "text TEXT,"
+        "created_at TEXT NOT NULL"
+        ")"
+    )
+    await db.execute("CREATE INDEX IF NOT EXISTS idx_messages_ts ON messages(ts, message_id)")
+    await db.execute("CREATE INDEX IF NOT EXISTS idx_messages_from_ts ON messages(from_msisdn, ts)")
 
-async def check_db(db_path: str) -> bool:
+    cur = await db.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name='messages_fts'")
+    fts_exists = await cur.fetchone() is not None
+    # trigram keeps ?q= a case-insensitive substring match; word tokenizers such as
+    # unicode61 would narrow it to whole-word/prefix matches.
+    await db.execute(
+        "CREATE VIRTUAL TABLE IF NOT EXISTS messages_fts USING fts5("
+        "text, content='messages', content_rowid='rowid', tokenize='trigram'"
+        ")"
+    )
+    await db.execute(
+        "CREATE TRIGGER IF NOT EXISTS messages_fts_ai AFTER INSERT ON messages BEGIN "
+        "INSERT INTO messages_fts(rowid, text) VALUES (new.rowid, new.text); "
+        "END"
+    )
+    await db.execute(
+        "CREATE TRIGGER IF NOT EXISTS messages_fts_ad AFTER DELETE ON messages BEGIN "
+        "INSERT INTO messages_fts(messages_fts, rowid, text) VALUES ('delete', old.rowid, old.text); "
+        "END"
+    )
+    await db.execute(
+        "CREATE TRIGGER IF NOT EXISTS messages_fts_au AFTER UPDATE ON messages BEGIN "
+        "INSERT INTO messages_fts(messages_fts, rowid, text) VALUES ('delete', old.rowid, old.text); "
+        "INSERT INTO messages_fts(rowid, text) VALUES (new.rowid, new.text); "
+        "END"
+    )
+    await db.execute(
+        "CREATE TABLE IF NOT EXISTS message_counts ("
+        "id INTEGER PRIMARY KEY CHECK (id = 0),"
+        "total INTEGER NOT NULL"
+        ")"
+    )
+    await db.execute("INSERT OR IGNORE INTO message_counts (id, total) SELECT 0, COUNT(*) FROM messages")
+    await db.execute(
+        "CREATE TRIGGER IF NOT EXISTS message_counts_ai AFTER INSERT ON messages BEGIN "
+        "UPDATE message_counts SET total = total + 1 WHERE id = 0; "
+        "END"
+    )
+    await db.execute(
+        "CREATE TRIGGER IF NOT EXISTS message_counts_ad AFTER DELETE ON messages BEGIN "
+        "UPDATE message_counts SET total = total - 1 WHERE id = 0; "
+        "END"
+    )
+
+    if not fts_exists:
+        # Index rows written before the FTS table existed.
+        await db.execute("INSERT INTO messages_fts(messages_fts) VALUES ('rebuild')")
+    await db.commit()
+
+
+async def check_db(db: aiosqlite.Connection | None) -> bool:
+    if db is None:
+        return False
     try:
-        async with aiosqlite.connect(db_path) as db:
-            await db.execute("SELECT 1")
-            cur = await db.execute(
-                "SELECT name FROM sqlite_master WHERE type='table' AND name='messages'"
-            )
-            row = await cur.fetchone()
-            return row is not None
+        await db.execute("SELECT 1")
+        cur = await db.execute(
+            "SELECT name FROM sqlite_master WHERE type='table' AND name='messages'"
+        )
+        row = await cur.fetchone()
+        return row is not None
     except Exception:
         return False
 
 
-async def insert_message(db_path: str, msg: MessageIn) -> bool:
-    created_at = _now_iso()
-    async with aiosqlite.connect(db_path) as db:
+async def insert_messages(db: aiosqlite.Connection, msgs: list[MessageIn]) -> list[bool]:
+    created_at = now_iso()
+    params: list[object] = []
+    for msg in msgs:
+        params.extend((msg.message_id, msg.from_msisdn, msg.to_msisdn, msg.ts, msg.text, created_at))
+
+    cur = await db.execute(
+        "INSERT INTO messages (message_id, from_msisdn, to_msisdn, ts, text, created_at) VALUES "
+        + ", ".join(["(?, ?, ?, ?, ?, ?)"] * len(msgs))
+        + " ON CONFLICT(message_id) DO NOTHING RETURNING message_id",
+        params,
+    )
+    inserted = {r[0] for r in await cur.fetchall()}
+    await db.commit()
+
+    created: list[bool] = []
+    for msg in msgs:
+        # A message_id repeated within one batch is only created by its first occurrence.
+        created.append(msg.message_id in inserted)
+        inserted.discard(msg.message_id)
+    return created
+
+
+_WRITER_STOP = object()
+
+
+class MessageWriter:
+    def __init__(self, db: aiosqlite.Connection, batch_size: int = WRITE_BATCH_SIZE) -> None:
+        self._db = db
+        self._batch_size = batch_size
+        self._queue: asyncio.Queue[object] = asyncio.Queue()
+        self._task: asyncio.Task[None] | None = None
+        self._closed = False
+
+    def start(self) -> None:
+        self._task = asyncio.create_task(self._run())
+
+    async def close(self) -> None:
+        # Graceful drain: everything queued before the stop marker is still committed.
+        self._closed = True
+        if self._task is not None:
+            self._queue.put_nowait(_WRITER_STOP)
+            await self._task
+            self._task = None
+        while not self._queue.empty():
+            item = self._queue.get_nowait()
+            if item is not _WRITER_STOP:
+                item[1].cancel()
+
+    async def insert(self, msg: MessageIn) -> bool:
+        if self._closed:
+            raise RuntimeError("message writer is closed")
+        fut: asyncio.Future[bool] = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait((msg, fut))
+        return await fut
+
+    async def _run(self) -> None:
+        while True:
+            item = await self._queue.get()
+            if item is _WRITER_STOP:
+                return
+            items = [item]
+            stop = False
+            while len(items) < self._batch_size and not self._queue.empty():
+                item = self._queue.get_nowait()
+                if item is _WRITER_STOP:
+                    stop = True
+                    break
+                items.append(item)
+
+            try:
+                await self._write_batch(items)
+            except asyncio.CancelledError:
+                for _, fut in items:
+                    if not fut.done():
+                        fut.cancel()
+                raise
+            if stop:
+                return
+
+    async def _write_batch(self, items: list[tuple[MessageIn, asyncio.Future[bool]]]) -> None:
         try:
-            await db.execute(
-                "INSERT INTO messages (message_id, from_msisdn, to_msisdn, ts, text, created_at) "
-                "VALUES (?, ?, ?, ?, ?, ?)",
-                (
-                    msg.message_id,
-                    msg.from_msisdn,
-                    msg.to_msisdn,
-                    msg.ts,
-                    msg.text,
-                    created_at,
-                ),
-            )
-            await db.commit()
-            return True
-        except aiosqlite.IntegrityError:
-            return False
+            created = await insert_messages(self._db, [msg for msg, _ in items])
+        except Exception as exc:
+            try:
+                await self._db.rollback()
+            except Exception:
+                pass
+            for _, fut in items:
+                if not fut.done():
+                    fut.set_exception(exc)
+            return
+
+        for (_, fut), was_created in zip(items, created):
+            if not fut.done():
+                fut.set_result(was_created)
 
 
 async def list_messages(
-    db_path: str,
+    db: aiosqlite.Connection,
     limit: int,
     offset: int,
     from_msisdn: str | None,
     since: str | None,
     q: str | None,
-) -> tuple[list[dict], int]:
+    after: tuple[str, str] | None = None,
+) -> tuple[list[dict], int, tuple[str, str] | None]:
+    from_sql = "messages"
     where: list[str] = []
     params: list[object] = []
 
@@ -80,61 +267,78 @@ async def list_messages(
         where.append("ts >= ?")
         params.append(since)
 
-    if q:
-        where.append("text LIKE ? COLLATE NOCASE")
-        params.append(f"%{q}%")
+    if q and len(q) >= 3:
+        # The trigram tokenizer answers case-insensitive substring phrases from the index.
+        from_sql = "messages JOIN messages_fts ON messages_fts.rowid = messages.rowid"
+        where.append("messages_fts MATCH ?")
+        params.append('"' + q.replace('"', '""') + '"')
+    elif q:
+        # Shorter than one trigram, so the FTS index cannot answer it.
+        # Escape LIKE wildcards so this is the same literal substring match as the FTS path.
+        where.append("messages.text LIKE ? COLLATE NOCASE ESCAPE '\\'")
+        params.append("%" + q.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%")
 
     where_sql = "" if not where else " WHERE " + " AND ".join(where)
 
-    async with aiosqlite.connect(db_path) as db:
-        db.row_factory = aiosqlite.Row
-        cur_total = await db.execute(f"SELECT COUNT(*) AS c FROM messages{where_sql}", params)
-        total_row = await cur_total.fetchone()
-        total = int(total_row["c"]) if total_row else 0
+    if where:
+        cur_total = await db.execute(f"SELECT COUNT(*) AS c FROM {from_sql}{where_sql}", params)
+    else:
+        cur_total = await db.execute("SELECT total AS c FROM message_counts WHERE id = 0")
+    total_row = await cur_total.fetchone()
+    total = int(total_row[0]) if total_row else 0
 
-        cur = await db.execute(
-            f"SELECT message_id, from_msisdn, to_msisdn, ts, text FROM messages{where_sql} "
-            "ORDER BY ts ASC, message_id ASC LIMIT ? OFFSET ?",
-            [*params, limit, offset],
-        )
-        rows = await cur.fetchall()
-        data = [
-            {
-                "message_id": r["message_id"],
-                "from": r["from_msisdn"],
-                "to": r["to_msisdn"],
-                "ts": r["ts"],
-                "text": r["text"],
-            }
-            for r in rows
-        ]
-        return data, total
-
-
-async def compute_stats(db_path: str) -> dict:
-    async with aiosqlite.connect(db_path) as db:
-        cur_total = await db.execute("SELECT COUNT(*) FROM messages")
-        total_messages = int((await cur_total.fetchone())[0])
-
-        cur_senders = await db.execute("SELECT COUNT(DISTINCT from_msisdn) FROM messages")
-        senders_count = int((await cur_senders.fetchone())[0])
-
-        cur_top = await db.execute(
-            "SELECT from_msisdn, COUNT(*) AS c FROM messages GROUP BY from_msisdn "
-            "ORDER BY c DESC, from_msisdn ASC LIMIT 10"
-        )
-        top_rows = await cur_top.fetchall()
-        messages_per_sender = [{"from": r[0], "count": int(r[1])} for r in top_rows]
-
-        cur_minmax = await db.execute("SELECT MIN(ts), MAX(ts) FROM messages")
-        minmax = await cur_minmax.fetchone()
-        first_ts = minmax[0] if minmax and minmax[0] is not None else None
-        last_ts = minmax[1] if minmax and minmax[1] is not None else None
-
-        return {
-            "total_messages": total_messages,
-            "senders_count": senders_count,
-            "messages_per_sender": messages_per_sender,
-            "first_message_ts": first_ts,
-            "last_message_ts": last_ts,
+    if after is not None:
+        # Keyset pagination: seek past the last (ts, message_id) instead of scanning OFFSET rows.
+        where.append("(ts, message_id) > (?, ?)")
+        params.extend(after)
+        where_sql = " WHERE " + " AND ".join(where)
+        offset = 0
+
+    cur = await db.execute(
+        "SELECT messages.message_id, messages.from_msisdn, messages.to_msisdn, messages.ts, messages.text "
+        f"FROM {from_sql}{where_sql} "
+        "ORDER BY ts ASC, message_id ASC LIMIT ? OFFSET ?",
+        [*params, limit + 1, offset],
+    )
+    rows = await cur.fetchall()
+    next_key = (rows[limit - 1][3], rows[limit - 1][0]) if len(rows) > limit else None
+    data = [
+        {
+            "message_id": r[0],
+            "from": r[1],
+            "to": r[2],
+            "ts": r[3],
+            "text": r[4],
         }
+        for r in rows[:limit]
+    ]
+    return data, total, next_key
+
+
+async def compute_stats(db: aiosqlite.Connection) -> dict:
+    cur_total = await db.execute("SELECT total FROM message_counts WHERE id = 0")
+    total_row = await cur_total.fetchone()
+    total_messages = int(total_row[0]) if total_row else 0
+
+    cur_senders = await db.execute("SELECT COUNT(DISTINCT from_msisdn) FROM messages")
+    senders_count = int((await cur_senders.fetchone())[0])
+
+    cur_top = await db.execute(
+        "SELECT from_msisdn, COUNT(*) AS c FROM messages GROUP BY from_msisdn "
+        "ORDER BY c DESC, from_msisdn ASC LIMIT 10"
+    )
+    top_rows = await cur_top.fetchall()
+    messages_per_sender = [{"from": r[0], "count": int(r[1])} for r in top_rows]
+
+    cur_minmax = await db.execute("SELECT MIN(ts), MAX(ts) FROM messages")
+    minmax = await cur_minmax.fetchone()
+    first_ts = minmax[0] if minmax and minmax[0] is not None else None
+    last_ts = minmax[1] if minmax and minmax[1] is not None else None
+
+    return {
+        "total_messages": total_messages,
+        "senders_count": senders_count,
+        "messages_per_sender": messages_per_sender,
+        "first_message_ts": first_ts,
+        "last_message_ts": last_ts,
+    }
@@ -17,10 +17,14 @@ def client(tmp_path, monkeypatch):
     monkeypatch.setenv("WEBHOOK_SECRET", "testsecret")
     monkeypatch.setenv("LOG_LEVEL", "INFO")
 
+    from app.config import load_settings
     from app.main import create_app
 
+    load_settings.cache_clear()
+
     app = create_app()
-    return TestClient(app)
+    with TestClient(app) as c:
+        yield c
 
 
 def _post(client: TestClient, payload: dict):
@@ -76,7 +80,7 @@ def test_pagination_filters_ordering(client: TestClient):
     assert body["data"][0]["message_id"] == "m2"
     assert body["data"][1]["message_id"] == "m1"
 
-    r2 = client.get("/messages?from=+911234567890")
+    r2 = client.get("/messages", params={"from": "+911234567890"})
     assert r2.status_code == 200
     body2 = r2.json()
     assert body2["total"] == 1
@@ -92,3 +96,78 @@ def test_pagination_filters_ordering(client: TestClient):
     body4 = r4.json()
     assert body4["total"] == 1
     assert body4["data"][0]["message_id"] == "m1"
+
+
+def test_cursor_pagination(client: TestClient):
+    for i in range(5):
+        _post(
+            client,
+            {
+                "message_id": f"m{i}",
+                "from": "+919876543210",
+                "to": "+14155550100",
+                "ts": f"2025-01-15T1{i}:00:00Z",
+                "text": "Hello",
+            },
+        )
+
+    seen = []
+    r = client.get("/messages?limit=2")
+    while True:
+        assert r.status_code == 200
+        body = r.json()
+        assert body["total"] == 5
+        seen.extend(m["message_id"] for m in body["data"])
+        if body["next_cursor"] is None:
+            break
+        r = client.get("/messages", params={"limit": 2, "cursor": body["next_cursor"]})
+
+    assert seen == ["m0", "m1", "m2", "m3", "m4"]
+
+    r_first = client.get("/messages?limit=2").json()
+    r_offset = client.get("/messages", params={"limit": 2, "offset": 40, "cursor": r_first["next_cursor"]})
+    assert r_offset.json()["offset"] == 0
+    assert [m["message_id"] for m in r_offset.json()["data"]] == ["m2", "m3"]
+
+    for bad in ("not-a-cursor", "eyJhIjoxLCJiIjoyfQ", "WyJhIiwiYiIsImMiXQ"):  # junk, {"a":1,"b":2}, ["a","b","c"]
+        assert client.get("/messages", params={"cursor": bad}).status_code == 422
+
+
+def test_text_search_matches_substrings(client: TestClient):
+    _post(
+        client,
+        {
+            "message_id": "m1",
+            "from": "+919876543210",
+            "to": "+14155550100",
+            "ts": "2025-01-15T10:00:00Z",
+            "text": "Order SHIPPED today",
+        },
+    )
+    _post(
+        client,
+        {
+            "message_id": "m2",
+            "from": "+919876543210",
+            "to": "+14155550100",
+            "ts": "2025-01-15T11:00:00Z",
+            "text": "Hello",
+        },
+    )
+    _post(
+        client,
+        {
+            "message_id": "m3",
+            "from": "+919876543210",
+            "to": "+14155550100",
+            "ts": "2025-01-15T12:00:00Z",
+            "text": "50%_off",
+        },
+    )
+
+    assert [m["message_id"] for m in client.get("/messages?q=hipped").json()["data"]] == ["m1"]
+    assert [m["message_id"] for m in client.get("/messages?q=he").json()["data"]] == ["m2"]
+    assert client.get("/messages?q=missing").json()["total"] == 0
+    assert [m["message_id"] for m in client.get("/messages", params={"q": "%"}).json()["data"]] == ["m3"]
+    assert [m["message_id"] for m in client.get("/messages", params={"q": "_"}).json()["data"]] == ["m3"]
+    assert client.get("/messages", params={"q": "\\"}).json()["total"] == 0
@@ -0,0 +1,75 @@
+import hashlib
+import hmac
+import json
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.metrics import Metrics
+
+
+def _sig(secret: str, body: str) -> str:
+    return hmac.new(secret.encode("utf-8"), body.encode("utf-8"), hashlib.sha256).hexdigest()
+
+
+@pytest.fixture()
+def client(tmp_path, monkeypatch):
+    db_file = tmp_path / "app.db"
+    monkeypatch.setenv("DATABASE_URL", f"sqlite:///{db_file}")
+    monkeypatch.setenv("WEBHOOK_SECRET", "testsecret")
+    monkeypatch.setenv("LOG_LEVEL", "INFO")
+
+    from app.config import load_settings
+    from app.main import create_app
+
+    load_settings.cache_clear()
+
+    app = create_app()
+    with TestClient(app) as c:
+        yield c
+
+
+def _post(client: TestClient, payload: dict):
+    body = json.dumps(payload)
+    sig = _sig("testsecret", body)
+    r = client.post(
+        "/webhook",
+        data=body,
+        headers={"Content-Type": "application/json", "X-Signature": sig},
+    )
+    assert r.status_code == 200
+
+
+def test_latency_histogram_is_cumulative():
+    m = Metrics()
+    for latency_ms in (50, 200, 900):
+        m.observe_http("/messages", 200, latency_ms * 1_000_000)
+
+    lines = m.render_prometheus().splitlines()
+
+    assert 'http_requests_total{path="/messages",status="200"} 3' in lines
+    assert 'request_latency_ms_bucket{le="100"} 1' in lines
+    assert 'request_latency_ms_bucket{le="500"} 2' in lines
+    assert 'request_latency_ms_bucket{le="+Inf"} 3' in lines
+    assert "request_latency_ms_count 3" in lines
+    assert "request_latency_ms_sum 1150.0" in lines
+
+
+def test_metrics_endpoint_exposes_request_series(client: TestClient):
+    _post(
+        client,
+        {
+            "message_id": "m1",
+            "from": "+919876543210",
+            "to": "+14155550100",
+            "ts": "2025-01-15T10:00:00Z",
+            "text": "Hello",
+        },
+    )
+
+    # Expire the pre-rendered buffer so the scrape renders the counters now.
+    client.app.state.metrics_rendered_at = float("-inf")
+    lines = client.get("/metrics").text.splitlines()
+
+    assert 'http_requests_total{path="/webhook",status="200"} 1' in lines
+    assert 'webhook_requests_total{result="created"} 1' in lines
@@ -17,10 +17,14 @@ def client(tmp_path, monkeypatch):
     monkeypatch.setenv("WEBHOOK_SECRET", "testsecret")
     monkeypatch.setenv("LOG_LEVEL", "INFO")
 
+    from app.config import load_settings
     from app.main import create_app
 
+    load_settings.cache_clear()
+
     app = create_app()
-    return TestClient(app)
+    with TestClient(app) as c:
+        yield c
 
 
 def _post(client: TestClient, payload: dict):
@@ -78,3 +82,32 @@ def test_stats_correctness(client: TestClient):
     top = body["messages_per_sender"]
     assert top[0]["from"] == "+919876543210"
     assert top[0]["count"] == 2
+
+
+def test_stats_reflects_new_message_immediately(client: TestClient):
+    _post(
+        client,
+        {
+            "message_id": "m1",
+            "from": "+919876543210",
+            "to": "+14155550100",
+            "ts": "2025-01-15T10:00:00Z",
+            "text": "Hello",
+        },
+    )
+    assert client.get("/stats").json()["total_messages"] == 1
+
+    _post(
+        client,
+        {
+            "message_id": "m2",
+            "from": "+911234567890",
+            "to": "+14155550100",
+            "ts": "2025-01-15T11:00:00Z",
+            "text": "Hello again",
+        },
+    )
+    body = client.get("/stats").json()
+    assert body["total_messages"] == 2
+    assert body["senders_count"] == 2
+    assert body["last_message_ts"] == "2025-01-15T11:00:00Z"
@@ -17,10 +17,14 @@ def client(tmp_path, monkeypatch):
     monkeypatch.setenv("WEBHOOK_SECRET", "testsecret")
     monkeypatch.setenv("LOG_LEVEL", "INFO")
 
+    from app.config import load_settings
     from app.main import create_app
 
+    load_settings.cache_clear()
+
     app = create_app()
-    return TestClient(app)
+    with TestClient(app) as c:
+        yield c
 
 
 def test_invalid_signature_401(client: TestClient):
@@ -73,3 +77,98 @@ def test_valid_insert_and_duplicate_idempotent(client: TestClient):
     r3 = client.get("/messages")
     assert r3.status_code == 200
     assert r3.json()["total"] == 1
+
+
+def test_writer_close_drains_in_flight_inserts(tmp_path):
+    import asyncio
+
+    from app.models import MessageIn
+    from app.storage import MessageWriter, ensure_schema, open_db
+
+    async def scenario():
+        db = await open_db(str(tmp_path / "writer.db"))
+        await ensure_schema(db)
+        writer = MessageWriter(db)
+        writer.start()
+
+        msgs = [
+            MessageIn(message_id=f"m{i}", from_msisdn="+919876543210", to_msisdn="+14155550100", ts="2025-01-15T10:00:00Z")
+            for i in range(200)
+        ]
+        tasks = [asyncio.create_task(writer.insert(m)) for m in msgs]
+        await asyncio.sleep(0)
+        await writer.close()
+
+        done, pending = await asyncio.wait(tasks, timeout=2)
+        assert not pending
+        created = [t.result() for t in done]
+
+        cur = await db.execute("SELECT COUNT(*) FROM messages")
+        count = (await cur.fetchone())[0]
+        await db.close()
+        return created, count
+
+    created, count = asyncio.run(scenario())
+    assert created == [True] * 200
+    assert count == 200
+
+
+def _post_signed(client: TestClient, body: str):
+    return client.post(
+        "/webhook",
+        data=body,
+        headers={"Content-Type": "application/json", "X-Signature": _sig("testsecret", body)},
+    )
+
+
+def test_validation_errors_422(client: TestClient):
+    valid = {
+        "message_id": "m1",
+        "from": "+919876543210",
+        "to": "+14155550100",
+        "ts": "2025-01-15T10:00:00Z",
+        "text": "Hello",
+    }
+
+    r = _post_signed(client, json.dumps({**valid, "from": "919876543210"}))
+    assert r.status_code == 422
+    assert r.json() == {
+        "detail": [{"loc": ["body", "from"], "msg": "from must be in E.164-like format", "type": "value_error"}]
+    }
+
+    r = _post_signed(client, json.dumps({**valid, "from": "919876543210", "to": "14155550100"}))
+    assert r.status_code == 422
+    assert [e["loc"] for e in r.json()["detail"]] == [["body", "from"], ["body", "to"]]
+
+    r = _post_signed(client, json.dumps({**valid, "ts": "2025-01-15T10:00:00"}))
+    assert r.status_code == 422
+    detail = r.json()["detail"]
+    assert len(detail) == 1
+    assert detail[0]["loc"] == ["body", "ts"]
+    assert detail[0]["type"] == "value_error"
+
+    r = _post_signed(client, json.dumps({k: v for k, v in valid.items() if k != "to"}))
+    assert r.status_code == 422
+    detail = r.json()["detail"]
+    assert len(detail) == 1
+    assert detail[0]["loc"] == ["body"]
+    assert detail[0]["type"] == "value_error"
+
+    r = _post_signed(client, '{"message_id": "m1",')
+    assert r.status_code == 422
+    detail = r.json()["detail"]
+    assert len(detail) == 1
+    assert detail[0]["loc"] == ["body"]
+    assert detail[0]["type"] == "json_invalid"
+
+    assert client.get("/messages").json()["total"] == 0
+
+
+@pytest.mark.parametrize("key", [b"", b"k", b"x" * 64, b"y" * 65, b"z" * 200])
+@pytest.mark.parametrize("body", [b"", b"{}", b"a" * 64, bytes(range(256)) * 3])
+def test_compute_sig_matches_hmac(tmp_path, monkeypatch, key: bytes, body: bytes):
+    monkeypatch.setenv("DATABASE_URL", f"sqlite:///{tmp_path / 'app.db'}")
+
+    from app.main import _compute_sig, _sig_contexts
+
+    assert _compute_sig(_sig_contexts(key), body) == hmac.new(key, body, hashlib.sha256).digest()